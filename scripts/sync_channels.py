@@ -8,18 +8,103 @@
 import json
 import yaml
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import re
+import io
+import codecs
 import os
+import hashlib
+import threading
 import sys
+import xml.etree.ElementTree as ET
 from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
 import difflib
 
+# 优先使用libyaml加速的YAML解析器，不可用时退回纯Python实现
+try:
+    from yaml import CSafeLoader as YamlLoader
+except ImportError:
+    from yaml import SafeLoader as YamlLoader
+
+# 优先使用orjson解析JSON，未安装时退回标准库
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+# 优先使用rapidfuzz做模糊匹配，未安装时退回difflib
+try:
+    from rapidfuzz import fuzz, process
+except ImportError:
+    process = None
+
+# 数据源
+KOREATV_JSON_URL = 'https://raw.githubusercontent.com/kenpark76/kenpark76.github.io/main/koreatv.json'
+KOREATV_EPG_URL = 'https://raw.githubusercontent.com/kenpark76/kenpark76.github.io/main/koreatvEPG.xml'
+BACKUP_M3U_URL = 'https://raw.githubusercontent.com/iptv-org/iptv/master/streams/kr.m3u'
+
+# 数据源的本地缓存目录（配合ETag/Last-Modified条件请求使用）
+CACHE_DIR = '.sync_cache'
+
+# 预编译的正则表达式
+TVG_LOGO_RE = re.compile(r'tvg-logo="([^"]+)"')
+GROUP_TITLE_RE = re.compile(r'group-title="([^"]*)"')
+EXTINF_NAME_RE = re.compile(r',([^,]+)$')
+
+class ChannelSpec(NamedTuple):
+    """单个频道的配置（加载时解析一次，之后只读）"""
+    name: str
+    json_match: str
+    epg_match: str
+    default_id: str
+    backup_source: bool
+    backup_match: str
+    group: str
+    
+    @classmethod
+    def from_config(cls, channel):
+        """从配置文件中的频道字典构建"""
+        return cls(
+            name=channel['name'],
+            json_match=channel['json_match'],
+            epg_match=channel['epg_match'],
+            default_id=channel.get('default_id', ''),
+            backup_source=channel.get('backup_source', False),
+            backup_match=channel.get('backup_match', channel['json_match']),
+            group=channel.get('group', '')
+        )
+
 class ChannelSync:
     def __init__(self):
         self.koreatv_json = None
         self.koreatv_epg = None
         self.backup_m3u = None
         self.channels_config = []
+        self.need_backup = False
+        self.session = requests.Session()
+        # 临时性网络错误和5xx响应自动重试（指数退避）
+        retry = Retry(
+            total=4,
+            backoff_factor=0.5,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=('GET',)
+        )
+        self.session.mount('https://', HTTPAdapter(max_retries=retry))
+        self.cached_urls = set()
+        self.json_channels = {}
+        self.backup_entries = []
+        self.backup_names = {}
+        self.backup_cache = {}
+        self.epg_channels = {}
+        self.epg_aliases = {}
+        self.epg_names = []
+        self.epg_nospace = {}
+        self.epg_casefold = {}
+        self.channel_id_cache = {}
+        self.log_buffer = threading.local()
         
     def load_config(self):
         """加载频道配置"""
@@ -43,283 +128,420 @@ class ChannelSync:
                 return False
                 
             with open(config_path, 'r', encoding='utf-8') as f:
-                config = yaml.safe_load(f)
-                self.channels_config = config.get('channels', [])
+                config = yaml.load(f, Loader=YamlLoader)
+                self.channels_config = [
+                    ChannelSpec.from_config(channel) for channel in config.get('channels', [])
+                ]
+            self.need_backup = any(channel.backup_source for channel in self.channels_config)
             print(f"✓ 从 {config_path} 加载了 {len(self.channels_config)} 个频道配置")
             return True
         except Exception as e:
             print(f"✗ 加载配置失败: {e}")
             return False
     
+    def download(self, url):
+        """下载单个数据源，内容未变化时直接使用本地缓存"""
+        cache_key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        body_path = os.path.join(CACHE_DIR, cache_key)
+        meta_path = body_path + '.json'
+        
+        # 有缓存时发送条件请求，服务器返回304则无需重新下载内容
+        headers = {}
+        if os.path.exists(body_path) and os.path.exists(meta_path):
+            try:
+                with open(meta_path, 'r', encoding='utf-8') as f:
+                    meta = json.load(f)
+                if meta.get('etag'):
+                    headers['If-None-Match'] = meta['etag']
+                if meta.get('last_modified'):
+                    headers['If-Modified-Since'] = meta['last_modified']
+            except (OSError, ValueError):
+                headers = {}
+        
+        response = self.session.get(url, headers=headers, timeout=10)
+        if response.status_code == 304:
+            self.cached_urls.add(url)
+            with open(body_path, 'rb') as f:
+                return f.read()
+        
+        response.raise_for_status()
+        content = response.content
+        
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            with open(body_path, 'wb') as f:
+                f.write(content)
+            with open(meta_path, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified')
+                }, f)
+        except OSError as e:
+            print(f"⚠ 写入缓存失败 {url}: {e}")
+        
+        return content
+    
+    def cache_note(self, url):
+        """数据源命中本地缓存时的提示"""
+        return "（未变化，使用本地缓存）" if url in self.cached_urls else ""
+    
     def fetch_data(self):
-        """获取所有数据源"""
+        """获取所有数据源（并发下载）"""
+        # 三个数据源互不依赖，并发下载，总耗时取决于最慢的一个
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            json_future = executor.submit(self.download, KOREATV_JSON_URL)
+            epg_future = executor.submit(self.download, KOREATV_EPG_URL)
+            backup_future = None
+            if self.need_backup:
+                backup_future = executor.submit(self.download, BACKUP_M3U_URL)
+        
         # 1. 获取koreatv.json
         try:
-            response = requests.get(
-                'https://raw.githubusercontent.com/kenpark76/kenpark76.github.io/main/koreatv.json',
-                timeout=10
-            )
-            self.koreatv_json = response.json()
-            print("✓ 获取koreatv.json成功")
+            content = json_future.result()
+            # orjson不接受UTF-8 BOM，解析前先去掉
+            if content.startswith(codecs.BOM_UTF8):
+                content = content[len(codecs.BOM_UTF8):]
+            self.koreatv_json = json_loads(content)
+            print("✓ 获取koreatv.json成功" + self.cache_note(KOREATV_JSON_URL))
         except Exception as e:
             print(f"✗ 获取koreatv.json失败: {e}")
             self.koreatv_json = []
+        self.index_json_channels()
         
         # 2. 获取koreatvEPG.xml
         try:
-            response = requests.get(
-                'https://raw.githubusercontent.com/kenpark76/kenpark76.github.io/main/koreatvEPG.xml',
-                timeout=10
-            )
-            self.koreatv_epg = response.text
-            print("✓ 获取koreatvEPG.xml成功")
+            self.koreatv_epg = epg_future.result()
+            print("✓ 获取koreatvEPG.xml成功" + self.cache_note(KOREATV_EPG_URL))
             
             # 预解析EPG中的所有频道，用于模糊匹配
             self.parse_epg_channels()
             
         except Exception as e:
             print(f"✗ 获取koreatvEPG.xml失败: {e}")
-            self.koreatv_epg = ""
+            self.koreatv_epg = b""
             self.epg_channels = {}
         
         # 3. 获取备用源（如果需要）
-        need_backup = any(channel.get('backup_source', False) for channel in self.channels_config)
-        if need_backup:
+        if backup_future is not None:
             try:
-                response = requests.get(
-                    'https://raw.githubusercontent.com/iptv-org/iptv/master/streams/kr.m3u',
-                    timeout=10
-                )
-                self.backup_m3u = response.text
-                print("✓ 获取备用源kr.m3u成功")
+                self.backup_m3u = backup_future.result().decode('utf-8', errors='replace')
+                print("✓ 获取备用源kr.m3u成功" + self.cache_note(BACKUP_M3U_URL))
             except Exception as e:
                 print(f"✗ 获取备用源kr.m3u失败: {e}")
                 self.backup_m3u = ""
+            self.index_backup_m3u()
         else:
             print("ℹ 没有频道需要备用源，跳过获取")
     
     def parse_epg_channels(self):
         """解析EPG中的所有频道，用于快速查找"""
         self.epg_channels = {}
+        self.epg_aliases = {}
+        self.epg_names = []
+        self.epg_nospace = {}
+        self.epg_casefold = {}
+        self.channel_id_cache = {}
         
         if not self.koreatv_epg:
             return
         
-        # 查找所有channel元素
-        pattern = r'<channel id="([^"]+)"[^>]*>\s*<display-name>([^<]+)</display-name>'
-        matches = re.findall(pattern, self.koreatv_epg)
+        # 流式解析XML，只处理channel元素；处理完的元素立即清除，避免整棵树常驻内存
+        try:
+            context = ET.iterparse(io.BytesIO(self.koreatv_epg), events=('start', 'end'))
+            _, root = next(context)
+            for event, elem in context:
+                if event != 'end':
+                    continue
+                if elem.tag == 'channel':
+                    channel_id = elem.get('id')
+                    display_names = [
+                        (name_elem.text or '').strip()
+                        for name_elem in elem.findall('display-name')
+                    ]
+                    if channel_id and display_names and display_names[0]:
+                        self.epg_channels[display_names[0]] = channel_id
+                    # 同一频道的其他display-name作为别名
+                    if channel_id:
+                        for alias in display_names[1:]:
+                            if alias:
+                                self.epg_aliases.setdefault(alias, channel_id)
+                if elem.tag in ('channel', 'programme'):
+                    root.clear()
+        except ET.ParseError as e:
+            print(f"✗ 解析EPG失败: {e}")
         
-        for channel_id, display_name in matches:
-            self.epg_channels[display_name.strip()] = channel_id
+        # 预先构建查找索引，避免每次查找都遍历全部频道
+        self.epg_names = list(self.epg_channels.keys())
+        for epg_name in self.epg_names:
+            self.epg_nospace.setdefault(epg_name.replace(' ', ''), epg_name)
+            self.epg_casefold.setdefault(epg_name.casefold(), epg_name)
         
         print(f"✓ 从EPG中解析了 {len(self.epg_channels)} 个频道")
     
+    def fuzzy_match(self, epg_match):
+        """模糊匹配EPG频道名，返回(频道名, 相似度)"""
+        if process is not None:
+            match = process.extractOne(epg_match, self.epg_names, scorer=fuzz.ratio, score_cutoff=60)
+            if match:
+                return match[0], match[1] / 100
+            return None, 0.0
+        
+        matches = difflib.get_close_matches(epg_match, self.epg_names, n=1, cutoff=0.6)
+        if matches:
+            return matches[0], difflib.SequenceMatcher(None, epg_match, matches[0]).ratio()
+        return None, 0.0
+    
     def find_channel_id(self, epg_match):
-        """智能查找频道ID"""
+        """智能查找频道ID，相同的epg_match只查找一次，匹配提示每次都输出"""
+        if epg_match not in self.channel_id_cache:
+            self.channel_id_cache[epg_match] = self.match_channel_id(epg_match)
+        channel_id, note = self.channel_id_cache[epg_match]
+        if note:
+            self.log(note)
+        return channel_id
+    
+    def match_channel_id(self, epg_match):
+        """按精确、去除空格、忽略大小写、模糊、部分匹配的顺序查找频道ID，返回(频道ID, 匹配提示)"""
         if not self.epg_channels:
-            return None
+            return None, None
         
-        # 1. 精确匹配
+        # 1. 精确匹配（包括频道的其他display-name）
         if epg_match in self.epg_channels:
-            return self.epg_channels[epg_match]
+            return self.epg_channels[epg_match], None
+        if epg_match in self.epg_aliases:
+            return self.epg_aliases[epg_match], None
         
         # 2. 尝试去除空格匹配（如"KBS1"匹配"KBS 1TV"）
-        simplified_epg_match = epg_match.replace(' ', '')
-        for epg_name, channel_id in self.epg_channels.items():
-            if epg_name.replace(' ', '') == simplified_epg_match:
-                print(f"  注意: 通过去除空格匹配: '{epg_match}' -> '{epg_name}'")
-                return channel_id
+        epg_name = self.epg_nospace.get(epg_match.replace(' ', ''))
+        if epg_name:
+            return self.epg_channels[epg_name], f"  注意: 通过去除空格匹配: '{epg_match}' -> '{epg_name}'"
         
-        # 3. 模糊匹配（使用difflib）
-        epg_names = list(self.epg_channels.keys())
-        matches = difflib.get_close_matches(epg_match, epg_names, n=1, cutoff=0.6)
+        # 3. 尝试忽略大小写匹配
+        epg_name = self.epg_casefold.get(epg_match.casefold())
+        if epg_name:
+            return self.epg_channels[epg_name], f"  注意: 通过忽略大小写匹配: '{epg_match}' -> '{epg_name}'"
         
-        if matches:
-            matched_name = matches[0]
-            similarity = difflib.SequenceMatcher(None, epg_match, matched_name).ratio()
-            print(f"  注意: 使用模糊匹配: '{epg_match}' -> '{matched_name}' (相似度: {similarity:.2f})")
-            return self.epg_channels[matched_name]
+        # 4. 模糊匹配
+        matched_name, similarity = self.fuzzy_match(epg_match)
+        
+        if matched_name:
+            note = f"  注意: 使用模糊匹配: '{epg_match}' -> '{matched_name}' (相似度: {similarity:.2f})"
+            return self.epg_channels[matched_name], note
         
-        # 4. 尝试部分匹配
+        # 5. 尝试部分匹配
         for epg_name, channel_id in self.epg_channels.items():
             if epg_match in epg_name or epg_name in epg_match:
-                print(f"  注意: 通过部分匹配: '{epg_match}' -> '{epg_name}'")
-                return channel_id
+                return channel_id, f"  注意: 通过部分匹配: '{epg_match}' -> '{epg_name}'"
         
-        return None
+        return None, None
     
     def extract_channel_id_from_epg(self, epg_match):
-        """从EPG XML中提取频道ID（增强版）"""
+        """从EPG中提取频道ID"""
         if not self.koreatv_epg:
             return None
         
-        # 首先尝试精确查找
-        channel_id = self.find_channel_id(epg_match)
-        
-        if channel_id:
-            return channel_id
+        return self.find_channel_id(epg_match)
+    
+    def index_json_channels(self):
+        """按名称索引koreatv.json中的频道，同名时保留第一个"""
+        self.json_channels = {}
         
-        # 如果没找到，尝试正则表达式搜索
-        try:
-            # 尝试多种可能的格式
-            patterns = [
-                f'<channel id="([^"]+)"[^>]*>\\s*<display-name>{re.escape(epg_match)}</display-name>',
-                f'<channel id="([^"]+)">\\s*<display-name>{re.escape(epg_match)}</display-name>',
-                f'<channel id="([^"]+)".*?<display-name>{re.escape(epg_match)}</display-name>',
-            ]
-            
-            for pattern in patterns:
-                match = re.search(pattern, self.koreatv_epg)
-                if match:
-                    return match.group(1)
-            
-            # 如果还没找到，尝试不区分大小写
-            pattern = f'<channel id="([^"]+)".*?<display-name>{re.escape(epg_match)}</display-name>'
-            match = re.search(pattern, self.koreatv_epg, re.IGNORECASE)
-            if match:
-                return match.group(1)
-                
-        except Exception as e:
-            print(f"✗ 解析EPG失败 {epg_match}: {e}")
+        if not isinstance(self.koreatv_json, list):
+            return
         
-        return None
+        for channel in self.koreatv_json:
+            if isinstance(channel, dict):
+                self.json_channels.setdefault(channel.get('name'), channel)
     
     def extract_info_from_json(self, json_match):
         """从koreatv.json提取频道信息"""
-        if not self.koreatv_json:
+        channel = self.json_channels.get(json_match)
+        if not channel:
             return None, None
         
         try:
-            for channel in self.koreatv_json:
-                if channel.get('name') == json_match:
-                    # 获取URL
-                    uris = channel.get('uris', [])
-                    url = uris[0] if uris else channel.get('url')
-                    
-                    # 获取logo
-                    logo = channel.get('logo', '')
-                    
-                    return url, logo
-            return None, None
+            # 获取URL
+            uris = channel.get('uris', [])
+            url = uris[0] if uris else channel.get('url')
+            
+            # 获取logo
+            logo = channel.get('logo', '')
+            
+            return url, logo
         except Exception as e:
-            print(f"✗ 从JSON提取信息失败 {json_match}: {e}")
+            self.log(f"✗ 从JSON提取信息失败 {json_match}: {e}")
             return None, None
     
+    def index_backup_m3u(self):
+        """逐行解析备用源，建立频道索引"""
+        self.backup_entries = []
+        self.backup_names = {}
+        self.backup_cache = {}
+        
+        if not self.backup_m3u:
+            return
+        
+        extinf_line = None
+        for line in io.StringIO(self.backup_m3u):
+            line = line.rstrip('\r\n')
+            
+            # EXTINF行的下一行应该是URL
+            if extinf_line is not None:
+                # 尝试从EXTINF行提取logo
+                logo_match = TVG_LOGO_RE.search(extinf_line)
+                logo = logo_match.group(1) if logo_match else ''
+                entry = (extinf_line, line, logo)
+                self.backup_entries.append(entry)
+                
+                name_match = EXTINF_NAME_RE.search(extinf_line)
+                if name_match:
+                    self.backup_names.setdefault(name_match.group(1).strip(), entry)
+                extinf_line = None
+            
+            if line.startswith('#EXTINF:'):
+                extinf_line = line
+    
     def extract_info_from_backup(self, backup_match):
         """从备用源提取频道信息"""
-        if not self.backup_m3u:
+        if not self.backup_entries:
             return None, None
         
         try:
-            lines = self.backup_m3u.split('\n')
-            for i, line in enumerate(lines):
-                if line.startswith('#EXTINF:') and backup_match in line:
-                    # 找到EXTINF行，下一行应该是URL
-                    if i + 1 < len(lines):
-                        url = lines[i + 1]
-                        
-                        # 尝试从EXTINF行提取logo
-                        logo_match = re.search(r'tvg-logo="([^"]+)"', line)
-                        logo = logo_match.group(1) if logo_match else ''
-                        
-                        return url, logo
-            return None, None
+            # 优先按频道名精确匹配，否则在EXTINF行中部分匹配
+            entry = self.backup_names.get(backup_match)
+            if entry:
+                return entry[1], entry[2]
+            
+            # 部分匹配需要遍历，结果按backup_match缓存
+            if backup_match not in self.backup_cache:
+                self.backup_cache[backup_match] = next(
+                    ((url, logo) for extinf_line, url, logo in self.backup_entries
+                     if backup_match in extinf_line),
+                    (None, None)
+                )
+            return self.backup_cache[backup_match]
         except Exception as e:
-            print(f"✗ 从备用源提取信息失败 {backup_match}: {e}")
+            self.log(f"✗ 从备用源提取信息失败 {backup_match}: {e}")
             return None, None
     
+    def log(self, message):
+        """输出日志；在线程池中处理频道时先写入当前线程的缓冲区"""
+        lines = getattr(self.log_buffer, 'lines', None)
+        if lines is None:
+            print(message)
+        else:
+            lines.append(message)
+    
+    def process_channel(self, channel):
+        """处理单个频道，返回(结果, 日志行)"""
+        self.log_buffer.lines = []
+        try:
+            result = self.extract_channel(channel)
+            return result, self.log_buffer.lines
+        finally:
+            self.log_buffer.lines = None
+    
+    def extract_channel(self, channel):
+        """提取单个频道的信息"""
+        name = channel.name
+        json_match = channel.json_match
+        epg_match = channel.epg_match
+        default_id = channel.default_id
+        backup_source = channel.backup_source
+        backup_match = channel.backup_match
+        group = channel.group  # 获取分组信息
+        
+        self.log(f"\n处理频道: {name}")
+        self.log(f"  JSON匹配: {json_match}")
+        self.log(f"  EPG匹配: {epg_match}")
+        if group:
+            self.log(f"  分组: {group}")
+        
+        # 1. 提取频道ID
+        channel_id = self.extract_channel_id_from_epg(epg_match)
+        if not channel_id:
+            channel_id = default_id
+            if channel_id:
+                self.log(f"  使用默认频道ID: {channel_id}")
+            else:
+                self.log(f"  ⚠ 警告: 未找到频道ID，将使用空值")
+        else:
+            self.log(f"  获取到频道ID: {channel_id}")
+        
+        # 2. 从主源提取URL和logo
+        url, logo = self.extract_info_from_json(json_match)
+        
+        # 3. 如果主源失败且配置了备用源，尝试备用源
+        if (not url or url == 'null') and backup_source:
+            self.log(f"  主源未找到，尝试备用源...")
+            backup_url, backup_logo = self.extract_info_from_backup(backup_match)
+            
+            if backup_url:
+                url = backup_url
+                if backup_logo and (not logo or logo == 'null'):
+                    logo = backup_logo
+                self.log(f"  从备用源获取URL成功")
+        
+        # 4. 验证结果
+        if not url or url == 'null':
+            self.log(f"  ⚠ 警告: 未找到播放URL")
+            url = None
+        
+        if not logo or logo == 'null':
+            self.log(f"  ⚠ 警告: 未找到logo")
+            logo = ''
+        
+        # 5. 保存结果
+        if url:
+            result = {
+                'name': name,
+                'channel_id': channel_id,
+                'url': url,
+                'logo': logo,
+                'group': group,  # 保存分组信息
+                'success': True
+            }
+            self.log(f"  ✓ 成功提取频道信息")
+        else:
+            result = {
+                'name': name,
+                'success': False
+            }
+            self.log(f"  ✗ 频道信息提取失败")
+        
+        return result
+    
     def process_channels(self):
         """处理所有频道"""
         channel_results = []
         
-        for channel in self.channels_config:
-            name = channel['name']
-            json_match = channel['json_match']
-            epg_match = channel['epg_match']
-            default_id = channel.get('default_id', '')
-            backup_source = channel.get('backup_source', False)
-            backup_match = channel.get('backup_match', json_match)
-            group = channel.get('group', '')  # 获取分组信息
-            
-            print(f"\n处理频道: {name}")
-            print(f"  JSON匹配: {json_match}")
-            print(f"  EPG匹配: {epg_match}")
-            if group:
-                print(f"  分组: {group}")
-            
-            # 1. 提取频道ID
-            channel_id = self.extract_channel_id_from_epg(epg_match)
-            if not channel_id:
-                channel_id = default_id
-                if channel_id:
-                    print(f"  使用默认频道ID: {channel_id}")
-                else:
-                    print(f"  ⚠ 警告: 未找到频道ID，将使用空值")
-            else:
-                print(f"  获取到频道ID: {channel_id}")
-            
-            # 2. 从主源提取URL和logo
-            url, logo = self.extract_info_from_json(json_match)
-            
-            # 3. 如果主源失败且配置了备用源，尝试备用源
-            if (not url or url == 'null') and backup_source:
-                print(f"  主源未找到，尝试备用源...")
-                backup_url, backup_logo = self.extract_info_from_backup(backup_match)
-                
-                if backup_url:
-                    url = backup_url
-                    if backup_logo and (not logo or logo == 'null'):
-                        logo = backup_logo
-                    print(f"  从备用源获取URL成功")
-            
-            # 4. 验证结果
-            if not url or url == 'null':
-                print(f"  ⚠ 警告: 未找到播放URL")
-                url = None
-            
-            if not logo or logo == 'null':
-                print(f"  ⚠ 警告: 未找到logo")
-                logo = ''
-            
-            # 5. 保存结果
-            if url:
-                channel_results.append({
-                    'name': name,
-                    'channel_id': channel_id,
-                    'url': url,
-                    'logo': logo,
-                    'group': group,  # 保存分组信息
-                    'success': True
-                })
-                print(f"  ✓ 成功提取频道信息")
-            else:
-                channel_results.append({
-                    'name': name,
-                    'success': False
-                })
-                print(f"  ✗ 频道信息提取失败")
+        # 各频道互不依赖，并行处理；map保持配置顺序，日志按频道依次输出
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            for result, lines in executor.map(self.process_channel, self.channels_config):
+                for line in lines:
+                    print(line)
+                channel_results.append(result)
         
         return channel_results
     
     def rebuild_m3u_file(self, channel_results):
         """完全重建kr.m3u文件，确保顺序与配置一致"""
+        tmp_path = 'kr.m3u.tmp'
         try:
+            successes = [c for c in channel_results if c['success']]
             print(f"\n开始重建kr.m3u文件...")
-            print(f"将包含 {len([c for c in channel_results if c['success']])} 个频道")
+            print(f"将包含 {len(successes)} 个频道")
             
-            # 构建新内容
-            lines = []
+            # 构建新内容，直接写入缓冲区
+            buf = io.StringIO()
             
             # 添加文件头
-            lines.append("#EXTM3U")
-            lines.append("")
+            buf.write("#EXTM3U")
             
-            # 按照配置文件顺序添加频道
+            # 按照配置文件顺序添加频道，同时统计分组
             added_count = 0
-            for channel in channel_results:
-                if not channel['success']:
-                    continue
-                
+            groups = {}
+            for channel in successes:
                 name = channel['name']
                 channel_id = channel['channel_id']
                 url = channel['url']
@@ -335,50 +557,38 @@ class ChannelSync:
                     # 无论group是否为空，都包含group-title属性
                     extinf_line = f'#EXTINF:-1 tvg-id="{channel_id}" group-title="{group}",{name}'
                 
-                # 添加到文件
-                lines.append(extinf_line)
-                lines.append(url)
-                lines.append("")  # 添加空行分隔
+                # 添加到文件，频道之间以空行分隔
+                buf.write(f"\n\n{extinf_line}\n{url}")
                 
                 added_count += 1
+                groups[group] = groups.get(group, 0) + 1
                 print(f"✓ 添加频道到新文件: {name}" + (f" (分组: {group})" if group else " (无分组)"))
             
-            # 移除最后一个空行
-            if lines and lines[-1] == "":
-                lines.pop()
-            
             # 写入文件
-            new_content = "\n".join(lines)
+            new_content = buf.getvalue()
             
-            with open('kr.m3u', 'w', encoding='utf-8') as f:
+            # 先写临时文件再原子替换，中途失败不会留下不完整的kr.m3u
+            with open(tmp_path, 'w', encoding='utf-8') as f:
                 f.write(new_content)
+            os.replace(tmp_path, 'kr.m3u')
             
             print(f"\n✓ 文件重建完成")
             print(f"  成功添加了 {added_count} 个频道")
             print(f"  频道顺序与配置文件完全一致")
             
             # 显示分组统计
-            groups = {}
-            for channel in channel_results:
-                if channel['success']:
-                    group_name = channel.get('group', '无分组')
-                    groups[group_name] = groups.get(group_name, 0) + 1
-            
             print(f"  分组统计:")
             for group_name, count in groups.items():
                 print(f"    {group_name}: {count}个频道")
             
-            # 验证生成的m3u文件
+            # 验证生成的m3u文件（内容与写入的完全一致，无需重新读取）
             print(f"  验证生成的文件:")
-            with open('kr.m3u', 'r', encoding='utf-8') as f:
-                content = f.read()
-                group_count = content.count('group-title=')
-                print(f"    包含 {group_count} 个group-title属性")
-                if group_count > 0:
-                    # 提取所有分组
-                    group_matches = re.findall(r'group-title="([^"]*)"', content)
-                    unique_groups = set(group_matches)
-                    print(f"    发现 {len(unique_groups)} 个唯一分组: {', '.join([g if g else '无分组' for g in unique_groups])}")
+            group_count = new_content.count('group-title=')
+            print(f"    包含 {group_count} 个group-title属性")
+            if group_count > 0:
+                # 单次遍历提取并去重所有分组，按首次出现的顺序输出
+                unique_groups = dict.fromkeys(m.group(1) for m in GROUP_TITLE_RE.finditer(new_content))
+                print(f"    发现 {len(unique_groups)} 个唯一分组: {', '.join(g if g else '无分组' for g in unique_groups)}")
             
             return True
             
@@ -386,6 +596,8 @@ class ChannelSync:
             print(f"✗ 重建m3u文件失败: {e}")
             import traceback
             traceback.print_exc()
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
             return False
     
     def run(self):